@@ -0,0 +1,323 @@
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import dantri1
+import qdnd1
+import vnexpress1
+
+FETCH_ATTEMPTS = 3
+RETRY_DELAY_SECONDS = 10      # doubled after every failed attempt
+FLUSH_BATCH_SIZE = 500        # articles converted to dicts and saved at a time
+
+# Crawler module, crawl function and news source label for every site
+CRAWLERS = {
+    "dantri": (dantri1, dantri1.crawl_dantri, "Dân trí"),
+    "qdnd": (qdnd1, qdnd1.crawl_qdnd, "Quân đội nhân dân"),
+    "vnexpress": (vnexpress1, vnexpress1.crawl_vnexpress, "VnExpress"),
+}
+
+
+class ArticleRecord:
+    """Compact in-memory article, used instead of a dict while backfilling."""
+
+    __slots__ = ("title", "url", "summary", "category", "news_source", "image_url")
+
+    def __init__(self, article):
+        self.title = article["title"]
+        self.url = article["url"]
+        self.summary = article["summary"]
+        self.category = sys.intern(article["category"])
+        self.news_source = sys.intern(article["news_source"])
+        self.image_url = article["image_url"]
+
+    def to_dict(self):
+        """Returns the article in the dictionary format used by save_to_postgresql."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class RateLimiter:
+    """Spaces out page requests shared by all backfill workers."""
+
+    def __init__(self, requests_per_second):
+        self.interval = 1.0 / requests_per_second
+        self.next_request = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """Blocks until the next request is allowed."""
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_request - now
+            self.next_request = max(now, self.next_request) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class CategoryBackfill:
+    """Pagination state of one category shared by the workers crawling it."""
+
+    def __init__(self, crawl, category_info, news_source_label, max_pages):
+        self.crawl = crawl
+        self.url = category_info["url"]
+        self.category = sys.intern(category_info["category"])
+        self.news_source = sys.intern(news_source_label)
+        self.max_pages = max_pages
+        self.next_page = 1
+        self.end_page = None
+        self.error_page = None
+        self.page_hashes = {}
+        self.pages_fetched = 0
+        self.lock = threading.Lock()
+
+    def has_pages_left(self):
+        """Whether there are pages left to hand out to workers."""
+        return self.end_page is None and self.error_page is None and self.next_page <= self.max_pages
+
+    def take_chunk(self, chunk_size):
+        """Reserves the next range of pages for a worker."""
+        first = self.next_page
+        self.next_page = min(first + chunk_size, self.max_pages + 1)
+        return first, self.next_page
+
+    def mark_end(self, last_page):
+        """Records the last page with articles, keeping the lowest one found."""
+        with self.lock:
+            if self.end_page is None or last_page < self.end_page:
+                self.end_page = last_page
+
+    def mark_error(self, page):
+        """Records a page that kept failing, stopping the category there."""
+        with self.lock:
+            if self.error_page is None or page < self.error_page:
+                self.error_page = page
+
+    def is_stopped(self, page):
+        """Whether the page lies beyond the end of pagination or a failed page."""
+        return ((self.end_page is not None and page > self.end_page)
+                or (self.error_page is not None and page > self.error_page))
+
+    def fetch_page(self, page, limiter):
+        """
+        Crawls one page, retrying with a growing delay when the request fails.
+
+        Returns:
+            list: The articles on the page, empty past the end of pagination
+                  (the crawlers also return an empty list for 404 pages).
+                  None if every attempt failed.
+        """
+        for attempt in range(FETCH_ATTEMPTS):
+            limiter.wait()
+            articles = self.crawl(
+                start_url=self.url,
+                category_label=self.category,
+                news_source_label=self.news_source,
+                num_pages=1,
+                start_page=page
+            )
+            with self.lock:
+                self.pages_fetched += 1
+            if articles is not None:
+                return articles
+            if attempt < FETCH_ATTEMPTS - 1:
+                time.sleep(RETRY_DELAY_SECONDS * 2 ** attempt)
+        return None
+
+    def crawl_chunk(self, first, stop, limiter):
+        """
+        Crawls the pages in [first, stop) until the end of pagination.
+
+        Returns:
+            list: ArticleRecord objects found on the pages.
+        """
+        records = []
+        for page in range(first, stop):
+            if self.is_stopped(page):
+                break
+            articles = self.fetch_page(page, limiter)
+            if articles is None:
+                self.mark_error(page)
+                break
+            if not articles:
+                self.mark_end(page - 1)
+                break
+
+            # Out of range pages often repeat the last page instead of being empty.
+            # Of two identical pages the higher one is past the end.
+            page_hash = hash(frozenset(article["url"] for article in articles))
+            with self.lock:
+                other_page = self.page_hashes.setdefault(page_hash, page)
+                self.page_hashes[page_hash] = min(page, other_page)
+            if other_page != page:
+                self.mark_end(max(page, other_page) - 1)
+                if page > other_page:
+                    break
+            records.extend(ArticleRecord(article) for article in articles)
+        return records
+
+
+def flush(buffer, module, counts, download_images=False, before_download=None):
+    """
+    Saves the buffered records of one crawler module. Records of batches that
+    could not be saved stay in the buffer for a later retry.
+
+    Args:
+        counts (dict): Running 'processed', 'inserted' and 'updated' totals,
+            updated in place from the save reports.
+
+    Returns:
+        bool: True if the whole buffer was saved.
+    """
+    kept = []
+    for start in range(0, len(buffer), FLUSH_BATCH_SIZE):
+        records = buffer[start:start + FLUSH_BATCH_SIZE]
+        report = {}
+        if module.save_to_postgresql([record.to_dict() for record in records], module.DB_CONFIG,
+                                     keep_revisions=module.KEEP_REVISIONS, download_images=download_images,
+                                     before_download=before_download, report=report):
+            counts["processed"] += len(records)
+            counts["inserted"] += report.get("inserted", 0)
+            counts["updated"] += report.get("updated", 0)
+        else:
+            print(f"Failed to save {len(records)} backfilled articles, keeping them for a retry.")
+            kept.extend(records)
+    buffer[:] = kept
+    return not kept
+
+
+def run_backfill(sources, max_pages, workers, chunk_size, requests_per_second, max_buffered_articles,
+                 category_filter=None, download_images=False):
+    """
+    Crawls the history of every category of the given sources, splitting the
+    page range of each category into chunks crawled by concurrent workers.
+
+    Args:
+        sources (list): Keys of CRAWLERS to backfill.
+        max_pages (int): The deepest page to crawl in any category.
+        workers (int): Number of concurrent workers.
+        chunk_size (int): Number of consecutive pages given to a worker at once.
+        requests_per_second (float): Ceiling on page requests across all workers.
+        max_buffered_articles (int): Articles kept in memory, across all
+            sources, before the largest buffer is written to PostgreSQL. No new
+            pages are handed out while the buffers are full.
+        category_filter (str): Only backfill categories whose URL contains it.
+        download_images (bool): Download article images, through the same
+            rate limiter as the pages.
+    """
+    limiter = RateLimiter(requests_per_second)
+    categories = []
+    for source in sources:
+        module, crawl, news_source_label = CRAWLERS[source]
+        for category_info in module.CATEGORIES_TO_CRAWL:
+            if category_filter and category_filter not in category_info["url"]:
+                continue
+            categories.append((source, CategoryBackfill(crawl, category_info, news_source_label, max_pages)))
+
+    buffers = {source: [] for source in sources}
+    buffered = 0
+    counts = {"processed": 0, "inserted": 0, "updated": 0}
+    before_download = limiter.wait if download_images else None
+    database_failures = 0
+    stopping = False
+
+    def flush_source(source):
+        nonlocal buffered
+        saved_all = flush(buffers[source], CRAWLERS[source][0], counts, download_images, before_download)
+        buffered = sum(len(buffer) for buffer in buffers.values())
+        return saved_all
+
+    def relieve_buffers():
+        """Flushes the largest buffer, backing off while the database keeps failing."""
+        nonlocal database_failures, stopping
+        if flush_source(max(buffers, key=lambda key: len(buffers[key]))):
+            database_failures = 0
+            return
+        database_failures += 1
+        if database_failures >= FETCH_ATTEMPTS:
+            print("Saving keeps failing; no more pages are handed out.")
+            stopping = True
+        else:
+            time.sleep(RETRY_DELAY_SECONDS * 2 ** (database_failures - 1))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight = {}
+        next_category = 0
+        while True:
+            if buffered >= max_buffered_articles and not stopping:
+                relieve_buffers()
+
+            # Hand out chunks round-robin, never more than one per worker at a time,
+            # and none while the buffers are full
+            pending = [item for item in categories if item[1].has_pages_left()]
+            while not stopping and pending and len(in_flight) < workers and buffered < max_buffered_articles:
+                source, state = pending[next_category % len(pending)]
+                next_category += 1
+                first, stop = state.take_chunk(chunk_size)
+                future = executor.submit(state.crawl_chunk, first, stop, limiter)
+                in_flight[future] = source
+                pending = [item for item in categories if item[1].has_pages_left()]
+
+            if not in_flight:
+                if pending and not stopping:
+                    continue
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                source = in_flight.pop(future)
+                try:
+                    records = future.result()
+                except Exception as e:
+                    print(f"Error in backfill worker: {e}")
+                    continue
+                buffers[source].extend(records)
+                buffered += len(records)
+
+    # Final flush, with the same retries as pages
+    for source in buffers:
+        for attempt in range(FETCH_ATTEMPTS):
+            if flush_source(source):
+                break
+            if attempt < FETCH_ATTEMPTS - 1:
+                time.sleep(RETRY_DELAY_SECONDS * 2 ** attempt)
+
+    print("\nBackfill report:")
+    for _, state in categories:
+        if state.error_page is not None:
+            status = f"stopped by request errors at page {state.error_page}"
+        elif state.end_page is not None:
+            status = f"last page {state.end_page}"
+        elif stopping and state.has_pages_left():
+            status = f"stopped at page {state.next_page - 1} because saving failed"
+        else:
+            status = f"last page >= {state.max_pages}"
+        print(f"  {state.news_source} / {state.category}: {status}, {state.pages_fetched} requests")
+    print(f"Backfilled {counts['processed']} articles: {counts['inserted']} rows inserted, "
+          f"{counts['updated']} updated. {buffered} articles could not be saved.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill the history of the news categories.")
+    parser.add_argument("--source", choices=sorted(CRAWLERS) + ["all"], default="all")
+    parser.add_argument("--category", help="only backfill categories whose URL contains this text")
+    parser.add_argument("--max-pages", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--chunk-size", type=int, default=10)
+    parser.add_argument("--requests-per-second", type=float, default=2.0)
+    parser.add_argument("--max-buffered-articles", type=int, default=5000)
+    parser.add_argument("--download-images", action="store_true",
+                        help="also download images, within the same request rate")
+    args = parser.parse_args()
+
+    run_backfill(
+        sources=sorted(CRAWLERS) if args.source == "all" else [args.source],
+        max_pages=args.max_pages,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        requests_per_second=args.requests_per_second,
+        max_buffered_articles=args.max_buffered_articles,
+        category_filter=args.category,
+        download_images=args.download_images
+    )
@@ -2,14 +2,15 @@ import requests
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin
 import psycopg2
+import psycopg2.extras
+import hashlib
 import os
 import sys
-import io
 
 # Đặt mã hóa đầu ra chuẩn là UTF-8 để xử lý ký tự tiếng Việt
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+sys.stdout.reconfigure(encoding='utf-8')
 
-def crawl_qdnd(start_url, category_label, news_source_label, num_pages=1):
+def crawl_qdnd(start_url, category_label, news_source_label, num_pages=1, start_page=1):
     """
     Crawls a specific category URL on Quan Doi Nhan Dan (qdnd.vn).
     
@@ -18,19 +19,21 @@ def crawl_qdnd(start_url, category_label, news_source_label, num_pages=1):
         category_label (str): The label to assign to all articles found on this page.
         news_source_label (str): The label for the news source (e.g., "Quân đội nhân dân").
         num_pages (int): The number of pages to crawl for the category.
+        start_page (int): The first page number to crawl.
 
     Returns:
         list: A list of dictionaries, where each dictionary represents an article.
-              Returns None if the page request fails.
+              Returns None if every page request fails.
     """
     seen_urls = set()
     articles = []
+    failed_pages = 0
 
     # Create folder to save images if it doesn't exist
     image_folder = 'qdnd'
     os.makedirs(image_folder, exist_ok=True)
     
-    for page in range(1, num_pages + 1):
+    for page in range(start_page, start_page + num_pages):
         page_url = f"{start_url}/p/{page}"
         print(f"\nCrawling category '{category_label}' on page: {page_url}")
         
@@ -70,18 +73,53 @@ def crawl_qdnd(start_url, category_label, news_source_label, num_pages=1):
                         }
                         articles.append(article_data)
 
+        except requests.exceptions.HTTPError as e:
+            # Past the last page the site answers 404 / 410: an empty page, not a failure
+            if e.response is not None and e.response.status_code in (404, 410):
+                print(f"Page not found: {page_url}")
+                continue
+            print(f"Error requesting page: {e}")
+            failed_pages += 1
+            continue
         except requests.exceptions.RequestException as e:
             print(f"Error requesting page: {e}")
+            failed_pages += 1
             continue 
     
+    if failed_pages == num_pages:
+        print(f"All page requests failed for category '{category_label}'.")
+        return None
+
     print(f"Crawled {len(articles)} articles from category '{category_label}'.")
     return articles
 
 
-def save_to_postgresql(articles, db_config):
+def compute_content_hash(article):
+    """
+    Builds a fingerprint of the editable parts of an article card.
+
+    Args:
+        article (dict): An article dictionary produced by the crawler.
+
+    Returns:
+        str: The SHA-1 hex digest of title and summary.
+    """
+    # image_url is left out: the stored image is not refreshed on update
+    parts = (article.get("title") or "", article.get("summary") or "")
+    return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def save_to_postgresql(articles, db_config, keep_revisions=False, download_images=True, before_download=None,
+                       report=None):
     """
     Saves a list of articles to a PostgreSQL database.
     It will create the 'raw_data' table if it doesn't exist.
+    Existing URLs are only updated when their content fingerprint changed;
+    set keep_revisions to archive the previous values in 'raw_data_revisions'.
+    Images are skipped when download_images is False; before_download, if
+    given, is called before each image request (e.g. to rate limit it).
+    If a report dict is given, it receives the 'compared', 'updated' and
+    'inserted' row counts.
     """
     if not articles:
         print("No articles to save.")
@@ -103,51 +141,120 @@ def save_to_postgresql(articles, db_config):
                 url TEXT UNIQUE
             );
         """)
+        cur.execute("ALTER TABLE raw_data ADD COLUMN IF NOT EXISTS content_hash TEXT;")
+        if keep_revisions:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS raw_data_revisions (
+                    id SERIAL PRIMARY KEY,
+                    raw_data_id INTEGER REFERENCES raw_data(id) ON DELETE CASCADE,
+                    title TEXT,
+                    summary TEXT,
+                    content_hash TEXT,
+                    revised_at TIMESTAMP DEFAULT NOW()
+                );
+            """)
         conn.commit()
 
-        cur.execute("SELECT MAX(id) FROM raw_data;")
-        max_id_result = cur.fetchone()[0]
-        image_counter = max_id_result + 1 if max_id_result else 1
-
-        print("Starting to save data to PostgreSQL...")
+        # Drop duplicate URLs (an article can be listed under several categories)
+        unique_articles = {}
         for article in articles:
-            cur.execute("SELECT url FROM raw_data WHERE url = %s;", (article['url'],))
-            existing_article_in_db = cur.fetchone()
+            unique_articles.setdefault(article['url'], article)
 
-            if existing_article_in_db:
-                print(f"Article '{article['url']}' already exists in the database. Skipping.")
-                continue
+        # Look up every known URL in one query instead of one SELECT per article
+        cur.execute(
+            "SELECT url, id, content_hash, title, summary FROM raw_data WHERE url = ANY(%s);",
+            (list(unique_articles),)
+        )
+        existing_rows = {url: row for url, *row in cur.fetchall()}
+
+        changed_rows = []
+        hash_only_rows = []
+        new_articles = []
+        for url, article in unique_articles.items():
+            content_hash = compute_content_hash(article)
+            if url in existing_rows:
+                row_id, stored_hash, stored_title, stored_summary = existing_rows[url]
+                if stored_hash is None and (stored_title, stored_summary) == (article['title'], article['summary']):
+                    # Row saved before fingerprints existed and still unchanged
+                    hash_only_rows.append((row_id, content_hash))
+                elif stored_hash != content_hash:
+                    changed_rows.append((row_id, article['title'], article['summary'], content_hash))
+            else:
+                new_articles.append((article, content_hash))
+
+        if hash_only_rows:
+            psycopg2.extras.execute_values(cur, """
+                UPDATE raw_data AS r
+                SET content_hash = v.content_hash
+                FROM (VALUES %s) AS v(id, content_hash)
+                WHERE r.id = v.id;
+            """, hash_only_rows)
+            conn.commit()
+
+        updated_count = 0
+        if changed_rows:
+            if keep_revisions:
+                cur.execute("""
+                    INSERT INTO raw_data_revisions (raw_data_id, title, summary, content_hash)
+                    SELECT id, title, summary, content_hash FROM raw_data WHERE id = ANY(%s);
+                """, ([row[0] for row in changed_rows],))
+            updated_rows = psycopg2.extras.execute_values(cur, """
+                UPDATE raw_data AS r
+                SET title = v.title, summary = v.summary, content_hash = v.content_hash
+                FROM (VALUES %s) AS v(id, title, summary, content_hash)
+                WHERE r.id = v.id
+                RETURNING r.id;
+            """, changed_rows, fetch=True)
+            # Commit the updates so a failed insert below cannot roll them back
+            conn.commit()
+            updated_count = len(updated_rows)
 
+        print("Starting to save data to PostgreSQL...")
+        inserted_count = 0
+        for article, content_hash in new_articles:
             image_path = None
-            if article.get("image_url"):
+            if download_images and article.get("image_url"):
                 try:
+                    if before_download:
+                        before_download()
                     image_response = requests.get(article["image_url"], stream=True, timeout=10)
                     image_response.raise_for_status()
                     
-                    image_name = f'image{image_counter}.png'
+                    # Named after the URL so concurrent crawlers never pick the same file
+                    image_name = hashlib.sha1(article['url'].encode("utf-8")).hexdigest() + '.png'
                     image_path = os.path.join("qdnd", image_name)
 
                     with open(image_path, 'wb') as f:
                        for chunk in image_response.iter_content(chunk_size=8192):
                            f.write(chunk)
-                    
-                    image_counter += 1
 
                 except requests.exceptions.RequestException as e:
                     print(f"Error downloading image {article['image_url']}: {e}")
                     image_path = None
 
+            # A savepoint per row, so a failed insert only drops that row
+            cur.execute("SAVEPOINT insert_article;")
             try:
                 cur.execute("""
-                    INSERT INTO raw_data (title, summary, image, category, news_source, url)
-                    VALUES (%s, %s, %s, %s, %s, %s);
-                """, (article['title'], article['summary'], image_path, article['category'], article['news_source'], article['url']))
+                    INSERT INTO raw_data (title, summary, image, category, news_source, url, content_hash)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    ON CONFLICT (url) DO NOTHING
+                    RETURNING id;
+                """, (article['title'], article['summary'], image_path, article['category'], article['news_source'], article['url'], content_hash))
+                if cur.fetchone():
+                    inserted_count += 1
+                cur.execute("RELEASE SAVEPOINT insert_article;")
             
             except psycopg2.Error as e:
                 print(f"Error inserting article {article['url']}: {e}")
-                conn.rollback()
+                cur.execute("ROLLBACK TO SAVEPOINT insert_article;")
 
         conn.commit()
+        if report is not None:
+            report.update(compared=len(existing_rows), updated=updated_count, inserted=inserted_count)
+        print(f"Compared {len(existing_rows)} existing rows: {updated_count} updated, "
+              f"{len(existing_rows) - len(changed_rows)} unchanged ({len(hash_only_rows)} given their first fingerprint). "
+              f"Inserted {inserted_count} new rows.")
         return True
 
     except psycopg2.Error as e:
@@ -160,6 +267,17 @@ def save_to_postgresql(articles, db_config):
 
 # --- Main execution part ---
 
+# Database connection configuration
+DB_CONFIG = {
+    "host": "localhost",
+    "database": "HeThongTrinhSat", 
+    "user": "postgres",
+    "password": "13082004"
+}
+
+# Copy the previous title and summary of edited articles into raw_data_revisions
+KEEP_REVISIONS = False
+
 CATEGORIES_TO_CRAWL = [
     {"url": "https://www.qdnd.vn/chinh-tri", "category": "Chính trị"},
     {"url": "https://www.qdnd.vn/quoc-phong-an-ninh", "category": "Quốc phòng an ninh"},
@@ -181,14 +299,6 @@ def run_crawling_job():
     """Function to execute the crawling process for all defined categories."""
     all_articles = []
     
-    # Database connection configuration
-    db_config = {
-        "host": "localhost",
-        "database": "HeThongTrinhSat", 
-        "user": "postgres",
-        "password": "13082004"
-    }
-
     for category_info in CATEGORIES_TO_CRAWL:
         articles = crawl_qdnd(
             start_url=category_info["url"],
@@ -200,7 +310,7 @@ def run_crawling_job():
             all_articles.extend(articles)
     
     if all_articles:
-        if save_to_postgresql(all_articles, db_config):
+        if save_to_postgresql(all_articles, DB_CONFIG, keep_revisions=KEEP_REVISIONS):
             print("\nSuccessfully saved all data to PostgreSQL!")
         else:
             print("\nFailed to save data!")
@@ -0,0 +1,506 @@
+import schedule
+import time
+import copy
+import json
+import math
+import os
+import random
+import sys
+
+import dantri1
+import qdnd1
+import vnexpress1
+
+# Crawler module, crawl function and news source label for every site
+CRAWLERS = [
+    (dantri1, dantri1.crawl_dantri, "Dân trí"),
+    (qdnd1, qdnd1.crawl_qdnd, "Quân đội nhân dân"),
+    (vnexpress1, vnexpress1.crawl_vnexpress, "VnExpress"),
+]
+
+STATS_FILE = "crawl_stats.json"
+TIMELINES_FILE = "publish_timelines.json"
+
+MIN_INTERVAL_HOURS = 0.5
+MAX_INTERVAL_HOURS = 24
+DEFAULT_INTERVAL_HOURS = 6    # used until a category has a rate estimate
+DEFAULT_DEPTH = 3             # same depth as the daily crawlers
+
+# Global ceiling on category page requests per hour, across all sites: the
+# rate of the daily crawl, every category at DEFAULT_DEPTH pages once a day
+BUDGET_WINDOW_HOURS = 24
+REQUEST_BUDGET_PER_HOUR = sum(len(module.CATEGORIES_TO_CRAWL) for module, _, _ in CRAWLERS) * DEFAULT_DEPTH / 24
+MAX_DEPTH = 10
+DEFAULT_PAGE_SIZE = 20
+
+TARGET_PAGES_PER_POLL = 2     # new articles expected per poll, in pages
+DEPTH_SAFETY_FACTOR = 2       # extra pages allowed on top of the expected ones
+NEW_PAGE_RATIO = 0.5          # stop paging once fewer than this share of cards are new
+RATE_SMOOTHING = 0.3          # weight of the latest observation in the rate average
+TRUNCATED_RATE_BOOST = 2      # a poll that hit max depth only saw a lower bound
+SEEN_URL_LIMIT = 1000
+RETRY_AFTER_FAILURE_MINUTES = 15
+
+# Category mix used by generate-timelines: three busy categories, the rest quiet
+SAMPLE_RATES = {f"category-{i:02d}": rate
+                for i, rate in enumerate([2, 2, 1.5] + [0.05 + 0.03 * i for i in range(32)])}
+
+
+class RequestBudget:
+    """
+    Counts page requests over a sliding window to enforce the budget at poll
+    time. The window is a day, like the daily crawl it replaces, so that a
+    fractional hourly budget is not rounded down.
+    """
+
+    def __init__(self, per_hour, window_hours=BUDGET_WINDOW_HOURS):
+        self.window = window_hours * 3600
+        self.limit = int(per_hour * window_hours)
+        self.request_times = []
+
+    def remaining(self, now):
+        """Number of requests still allowed in the window ending at now."""
+        self.request_times = [t for t in self.request_times if t > now - self.window]
+        return max(self.limit - len(self.request_times), 0)
+
+    def allows(self, depth, now):
+        """Whether a poll of up to depth pages fits into the budget at now."""
+        return self.remaining(now) >= min(depth, self.limit)
+
+    def record(self, now):
+        """Counts one request made at now."""
+        self.request_times.append(now)
+
+
+def plan_category(stats, interval_scale=1.0, depth_scale=1.0):
+    """
+    Chooses the polling interval and page depth for one category.
+
+    Args:
+        stats (dict): The learned statistics of the category ('rate' in new
+            articles per hour and 'page_size' in cards per page).
+        interval_scale (float): Multiplier applied to the interval, used to
+            fit the plan into the request budget.
+        depth_scale (float): Multiplier applied to the depth, used once the
+            intervals cannot be stretched any further.
+
+    Returns:
+        tuple: (interval in hours, maximum number of pages per poll).
+    """
+    rate = stats.get("rate")
+    page_size = stats.get("page_size") or DEFAULT_PAGE_SIZE
+    if rate is None:
+        interval = min(DEFAULT_INTERVAL_HOURS * interval_scale, MAX_INTERVAL_HOURS)
+        return interval, DEFAULT_DEPTH
+
+    rate = max(rate, 1e-3)
+    interval = TARGET_PAGES_PER_POLL * page_size / rate * interval_scale
+    interval = min(max(interval, MIN_INTERVAL_HOURS), MAX_INTERVAL_HOURS)
+    # One spare page: early stopping means it is only fetched when needed
+    depth = math.ceil(rate * interval * DEPTH_SAFETY_FACTOR / page_size) + 1
+    depth = min(depth, MAX_DEPTH)
+    depth = max(int(depth * depth_scale), 1)
+    return interval, depth
+
+
+def expected_requests_per_hour(stats, interval, depth):
+    """
+    Estimates how many page requests per hour a category plan will cost.
+
+    Args:
+        stats (dict): The learned statistics of the category.
+        interval (float): Polling interval in hours.
+        depth (int): Maximum number of pages per poll.
+
+    Returns:
+        float: The expected number of requests per hour.
+    """
+    rate = stats.get("rate")
+    if rate is None:
+        return depth / interval
+    page_size = stats.get("page_size") or DEFAULT_PAGE_SIZE
+    pages = min(depth, int(rate * interval / page_size) + 1)
+    return pages / interval
+
+
+def plan_schedule(all_stats, budget_per_hour=REQUEST_BUDGET_PER_HOUR, warn=True):
+    """
+    Plans every category and stretches the intervals until the whole plan
+    fits into the global request budget. Once every interval is at its
+    maximum, the depths are reduced instead, since for busy categories the
+    request rate hardly depends on the interval.
+
+    Args:
+        all_stats (dict): Statistics of every category, keyed by category URL.
+        budget_per_hour (float): The maximum number of requests per hour.
+        warn (bool): Print a warning when the budget cannot be met.
+
+    Returns:
+        dict: (interval, depth) tuples keyed by category URL.
+    """
+    def total_requests(plans):
+        return sum(expected_requests_per_hour(all_stats[key], *plan) for key, plan in plans.items())
+
+    interval_scale = 1.0
+    while True:
+        plans = {key: plan_category(stats, interval_scale) for key, stats in all_stats.items()}
+        if total_requests(plans) <= budget_per_hour:
+            return plans
+        if all(interval >= MAX_INTERVAL_HOURS for interval, _ in plans.values()):
+            break
+        interval_scale *= 1.25
+
+    depth_scale = 1.0
+    while True:
+        depth_scale *= 0.8
+        plans = {key: plan_category(stats, interval_scale, depth_scale) for key, stats in all_stats.items()}
+        if total_requests(plans) <= budget_per_hour:
+            return plans
+        if all(depth == 1 for _, depth in plans.values()):
+            if warn:
+                print(f"Warning: the request budget of {budget_per_hour}/h cannot be met "
+                      f"(planned {total_requests(plans):.1f}/h); polls are capped at poll time.")
+            return plans
+
+
+def poll_category(fetch_page, stats, depth):
+    """
+    Fetches category pages until the listing reaches already seen articles.
+
+    Args:
+        fetch_page (callable): Takes a page number, returns the list of
+            article URLs found on that page, or None if the request failed.
+        stats (dict): The learned statistics of the category. Its 'seen' list
+            is updated in place.
+        depth (int): Maximum number of pages to fetch.
+
+    Returns:
+        tuple: (list of new URLs, number of pages fetched, True if the poll
+               stopped at max depth while the last page was still new), or
+               None if the first page could not be fetched.
+    """
+    seen = set(stats.get("seen", []))
+    new_urls = []
+    page_sizes = []
+    truncated = False
+    for page in range(1, depth + 1):
+        urls = fetch_page(page)
+        if urls is None:
+            if page == 1:
+                # A failed first page says nothing about the publish rate
+                return None
+            break
+        page_new = [url for url in urls if url not in seen]
+        seen.update(page_new)
+        new_urls.extend(page_new)
+        if urls:
+            page_sizes.append(len(urls))
+        if not urls or len(page_new) < NEW_PAGE_RATIO * len(urls):
+            break
+    else:
+        truncated = True
+
+    stats["seen"] = (stats.get("seen", []) + new_urls)[-SEEN_URL_LIMIT:]
+    if page_sizes:
+        stats["page_size"] = max(page_sizes)
+    return new_urls, len(page_sizes) if page_sizes else 1, truncated
+
+
+def update_rate(stats, new_count, now, truncated):
+    """
+    Updates the smoothed new-article rate of a category after a poll.
+
+    Args:
+        stats (dict): The learned statistics of the category.
+        new_count (int): Number of new articles seen in the poll.
+        now (float): Time of the poll, in seconds since the epoch.
+        truncated (bool): Whether the poll stopped at max depth.
+    """
+    last_poll = stats.get("last_poll")
+    stats["last_poll"] = now
+    if last_poll is None or now <= last_poll:
+        # The first poll only seeds the seen URLs
+        return
+
+    observed = new_count / ((now - last_poll) / 3600)
+    if truncated:
+        observed *= TRUNCATED_RATE_BOOST
+    if stats.get("rate") is None:
+        stats["rate"] = observed
+    else:
+        stats["rate"] = (1 - RATE_SMOOTHING) * stats["rate"] + RATE_SMOOTHING * observed
+
+
+def is_due(stats, interval, now):
+    """Whether a category should be polled at now."""
+    if now < stats.get("retry_at", 0):
+        return False
+    return stats.get("last_poll") is None or now - stats["last_poll"] >= interval * 3600
+
+
+def due_categories(all_stats, plans, now):
+    """Keys of the due categories, the longest waiting first."""
+    due = [key for key, stats in all_stats.items() if is_due(stats, plans[key][0], now)]
+    return sorted(due, key=lambda key: all_stats[key].get("last_poll") or 0)
+
+
+def load_stats():
+    """Loads the learned category statistics, or an empty dict on first run."""
+    if not os.path.exists(STATS_FILE):
+        return {}
+    with open(STATS_FILE, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_stats(all_stats):
+    """Writes the learned category statistics to disk."""
+    with open(STATS_FILE, 'w', encoding='utf-8') as f:
+        json.dump(all_stats, f, ensure_ascii=False)
+
+
+def record_timelines(key, times):
+    """
+    Appends first-seen times of new articles to TIMELINES_FILE, in the format
+    read by simulate. They trail the real publish times by at most one
+    polling interval.
+    """
+    timelines = {}
+    if os.path.exists(TIMELINES_FILE):
+        with open(TIMELINES_FILE, encoding='utf-8') as f:
+            timelines = json.load(f)
+    timelines.setdefault(key, []).extend(times)
+    with open(TIMELINES_FILE, 'w', encoding='utf-8') as f:
+        json.dump(timelines, f)
+
+
+request_budget = RequestBudget(REQUEST_BUDGET_PER_HOUR)
+
+
+def run_due_categories():
+    """
+    Crawls every category whose polling interval has elapsed and saves the
+    fetched articles to PostgreSQL.
+    """
+    all_stats = load_stats()
+    categories = {}
+    for module, crawl, news_source_label in CRAWLERS:
+        for category_info in module.CATEGORIES_TO_CRAWL:
+            all_stats.setdefault(category_info["url"], {})
+            categories[category_info["url"]] = (module, crawl, news_source_label, category_info)
+    all_stats = {key: stats for key, stats in all_stats.items() if key in categories}
+    plans = plan_schedule(all_stats)
+
+    for key in due_categories(all_stats, plans, time.time()):
+        module, crawl, news_source_label, category_info = categories[key]
+        stats = all_stats[key]
+        interval, depth = plans[key]
+        now = time.time()
+        if not request_budget.allows(depth, now):
+            print("Request budget used up for now; remaining categories wait.")
+            break
+        depth = min(depth, request_budget.remaining(now))
+
+        fetched = []
+
+        def fetch_page(page):
+            request_budget.record(time.time())
+            articles = crawl(
+                start_url=category_info["url"],
+                category_label=category_info["category"],
+                news_source_label=news_source_label,
+                num_pages=1,
+                start_page=page
+            )
+            # Category pages are never empty, so an empty first page is a failure too
+            if articles is None or (not articles and page == 1):
+                return None
+            fetched.extend(articles)
+            return [article["url"] for article in articles]
+
+        previous_stats = copy.deepcopy(stats)
+        result = poll_category(fetch_page, stats, depth)
+        if result is None:
+            print(f"Category '{category_info['category']}': first page failed, "
+                  f"retrying in {RETRY_AFTER_FAILURE_MINUTES} minutes.")
+            stats["retry_at"] = now + RETRY_AFTER_FAILURE_MINUTES * 60
+            save_stats(all_stats)
+            continue
+
+        # Existing articles are saved too so that edited titles get updated
+        if not module.save_to_postgresql(fetched, module.DB_CONFIG, keep_revisions=module.KEEP_REVISIONS):
+            # Forget this poll, otherwise its unsaved articles would count as seen
+            print(f"Category '{category_info['category']}': saving failed, "
+                  f"retrying in {RETRY_AFTER_FAILURE_MINUTES} minutes.")
+            previous_stats["retry_at"] = now + RETRY_AFTER_FAILURE_MINUTES * 60
+            all_stats[key] = previous_stats
+            save_stats(all_stats)
+            continue
+
+        new_urls, pages, truncated = result
+        if stats.get("last_poll") is not None and new_urls:
+            record_timelines(key, [now] * len(new_urls))
+        update_rate(stats, len(new_urls), now, truncated)
+        print(f"Category '{category_info['category']}': {len(new_urls)} new articles "
+              f"in {pages} page(s), every {interval:.1f}h up to {depth} page(s).")
+        save_stats(all_stats)
+
+
+def generate_timelines(rates, days=30, seed=1, start=None):
+    """
+    Generates synthetic publish timelines for simulate, with most articles
+    published between 06:00 and 22:00.
+
+    Args:
+        rates (dict): Average new articles per hour, keyed by category.
+        days (int): Length of the timelines in days.
+        seed (int): Seed of the random generator, for repeatable runs.
+        start (float): Start time in seconds since the epoch.
+
+    Returns:
+        dict: Publish times in seconds since the epoch, keyed by category.
+    """
+    rng = random.Random(seed)
+    if start is None:
+        start = time.mktime((2026, 1, 1, 0, 0, 0, 0, 0, -1))
+    timelines = {}
+    for key, rate in rates.items():
+        times = []
+        t = start
+        while True:
+            hour = time.localtime(t).tm_hour
+            t += rng.expovariate(rate * (1.6 if 6 <= hour < 22 else 0.2) / 3600)
+            if t >= start + days * 24 * 3600:
+                break
+            times.append(t)
+        timelines[key] = times
+    return timelines
+
+
+def simulate(timelines, page_size=DEFAULT_PAGE_SIZE, budget_per_hour=None, baseline_pages=DEFAULT_DEPTH):
+    """
+    Replays recorded publish timelines against the daily 07:00 crawl and the
+    adaptive scheduler, and compares requests and coverage.
+
+    Each category listing is modelled as the articles published so far,
+    newest first, split into pages of page_size cards. Coverage only counts
+    articles published at least a day before the last daily run.
+
+    Args:
+        timelines (dict): Publish times in seconds since the epoch, as lists
+            keyed by category.
+        page_size (int): Number of cards on a category page.
+        budget_per_hour (float): The request budget of the adaptive scheduler.
+            Defaults to the request rate of the daily crawl.
+        baseline_pages (int): Pages fetched per category by the daily crawl.
+
+    Returns:
+        dict: 'baseline' and 'adaptive' results, each with 'requests',
+              'covered' and 'total' article counts.
+    """
+    timelines = {key: sorted(times) for key, times in timelines.items() if times}
+    if not timelines:
+        raise ValueError("the timelines contain no publish times")
+    if budget_per_hour is None:
+        budget_per_hour = len(timelines) * baseline_pages / 24
+    start = min(times[0] for times in timelines.values())
+    end = max(times[-1] for times in timelines.values())
+
+    def listing_page(key, now, page):
+        times = timelines[key]
+        published = [f"{key}#{i}" for i in range(len(times)) if times[i] <= now]
+        published.reverse()
+        return published[(page - 1) * page_size:page * page_size]
+
+    # Daily crawl at 07:00 (local time of the first article's day)
+    first_day = time.localtime(start)
+    first_run = time.mktime((first_day.tm_year, first_day.tm_mon, first_day.tm_mday, 7, 0, 0, 0, 0, -1))
+    last_run = first_run
+    while last_run + 24 * 3600 <= end + 24 * 3600:
+        last_run += 24 * 3600
+
+    # Only score articles that both policies had a full day to pick up
+    cutoff = last_run - MAX_INTERVAL_HOURS * 3600
+    scored = {f"{key}#{i}" for key, times in timelines.items() for i in range(len(times)) if times[i] <= cutoff}
+
+    baseline_seen = set()
+    baseline_requests = 0
+    run_at = first_run
+    while run_at <= last_run:
+        for key in timelines:
+            for page in range(1, baseline_pages + 1):
+                baseline_seen.update(listing_page(key, run_at, page))
+                baseline_requests += 1
+        run_at += 24 * 3600
+
+    # Adaptive scheduler, ticking every minute like the live loop
+    all_stats = {key: {} for key in timelines}
+    budget = RequestBudget(budget_per_hour)
+    adaptive_seen = set()
+    adaptive_requests = 0
+    plans = plan_schedule(all_stats, budget_per_hour, warn=False)
+    now = first_run
+    while now <= last_run:
+        due = due_categories(all_stats, plans, now)
+        for key in due:
+            stats = all_stats[key]
+            if not budget.allows(plans[key][1], now):
+                break
+            depth = min(plans[key][1], budget.remaining(now))
+            requested = []
+
+            def fetch_page(page):
+                requested.append(page)
+                budget.record(now)
+                return listing_page(key, now, page)
+
+            new_urls, _, truncated = poll_category(fetch_page, stats, depth)
+            adaptive_requests += len(requested)
+            adaptive_seen.update(new_urls)
+            update_rate(stats, len(new_urls), now, truncated)
+        if due:
+            plans = plan_schedule(all_stats, budget_per_hour, warn=False)
+        now += 60
+
+    return {
+        "baseline": {"requests": baseline_requests, "covered": len(baseline_seen & scored), "total": len(scored)},
+        "adaptive": {"requests": adaptive_requests, "covered": len(adaptive_seen & scored), "total": len(scored)},
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "generate-timelines":
+        # python scheduler2.py generate-timelines timelines.json
+        with open(sys.argv[2], 'w', encoding='utf-8') as f:
+            json.dump(generate_timelines(SAMPLE_RATES), f)
+        sys.exit(0)
+
+    if len(sys.argv) > 1 and sys.argv[1] == "simulate":
+        # python scheduler2.py simulate [timelines.json]
+        # timelines.json: {"<category>": [<publish time, seconds since epoch>, ...], ...}
+        # Defaults to the timelines recorded by the scheduler in TIMELINES_FILE.
+        timelines_file = sys.argv[2] if len(sys.argv) > 2 else TIMELINES_FILE
+        if not os.path.exists(timelines_file):
+            print(f"Error: {timelines_file} not found. Let the scheduler record publish times first, "
+                  "or create one with 'generate-timelines'.")
+            sys.exit(1)
+        with open(timelines_file, encoding='utf-8') as f:
+            try:
+                results = simulate(json.load(f))
+            except ValueError as e:
+                print(f"Error: cannot simulate {timelines_file}: {e}.")
+                sys.exit(1)
+        for policy, result in results.items():
+            print(f"{policy}: {result['requests']} requests, "
+                  f"{result['covered']}/{result['total']} articles covered")
+        sys.exit(0)
+
+    # Kiểm tra mỗi phút xem chuyên mục nào đã đến lượt crawl
+    schedule.every(1).minutes.do(run_due_categories)
+
+    print("Adaptive scheduler started. Categories are polled according to their publish rate.")
+    print("Press Ctrl+C to stop the scheduler.")
+
+    run_due_categories()
+    while True:
+        schedule.run_pending()
+        time.sleep(1)